@@ -1,19 +1,22 @@
 import numpy as np
-from scipy.stats import norm
-from scipy.optimize import minimize
 from scipy import stats
-import numdifftools as nd
+from scipy.linalg import cho_factor, cho_solve
 import jax
 import jax.numpy as jnp
-from jax import grad, jit, hessian
-from jaxopt import LBFGS
-from functools import partial
+from jax import grad, jit
+from jax.scipy.optimize import minimize
+from jax.scipy.stats import norm as jnorm
+from jax.scipy.linalg import cho_factor as jcho_factor, cho_solve as jcho_solve
+from functools import partial, lru_cache
 import math
+import os
+import warnings
 import jax.random as jr
-import patsy
-from patsy import dmatrices
 import pandas as pd
-from dataclasses import dataclass, field
+from dataclasses import dataclass
+
+# The one-step MLE targets tight tolerances and needs double precision throughout.
+jax.config.update("jax_enable_x64", True)
 
 
 @dataclass
@@ -60,23 +63,29 @@ def _ols_bca_core(Y, Xhat, fpr, m, target_idx: int = 0):
         X = X.reshape(-1, 1)
 
 
-    b0, V0, sXX = _ols_core(Y, X, se=True, intercept=False)
+    b0, V0, _, solve = _ols_core(Y, X, se=True, intercept=False, return_solver=True)
 
 
-    d = X.shape[1]
-    A = np.zeros((d, d))
-    A[target_idx, target_idx] = 1.0
-    Gamma = np.linalg.solve(sXX, A)
+    # A = e_t e_t' is rank one, so Gamma = inv(sXX) A = g e_t' with g = inv(sXX) e_t
+    t = target_idx
+    e_t = np.zeros(X.shape[1])
+    e_t[t] = 1.0
+    g = solve(e_t)
 
 
-    b_corr = b0 + fpr * (Gamma @ b0)
-    I = np.eye(d)
-    V_corr = (
-        (I + fpr * Gamma) @ V0 @ (I + fpr * Gamma).T
-        + fpr * (1.0 - fpr) * (Gamma @ (V0 + np.outer(b_corr, b_corr)) @ Gamma.T) / m
+    b_corr = b0 + fpr * g * b0[t]
+    V_corr = _rank_one_sandwich(
+        V0, g, fpr, t, s=fpr * (1.0 - fpr) * (V0[t, t] + b_corr[t] ** 2) / m
     )
     return b_corr, V_corr
 
+def _rank_one_sandwich(V, g, c, t, s=0.0):
+    """Return K V K' + s g g' for K = I + c g e_t' without forming K."""
+    KV = V + c * np.outer(g, V[t])
+    # both remaining terms end in g', so fold them into a single outer product
+    KV += np.outer(c * KV[:, t] + s * g, g)
+    return KV
+
 def _ols_bcm_core(Y, Xhat, fpr, m, target_idx: int = 0):
     Y = np.asarray(Y).ravel()
     X = np.asarray(Xhat)
@@ -84,20 +93,21 @@ def _ols_bcm_core(Y, Xhat, fpr, m, target_idx: int = 0):
         X = X.reshape(-1, 1)
 
 
-    b0, V0, sXX = _ols_core(Y, X, se=True, intercept=False)
+    b0, V0, _, solve = _ols_core(Y, X, se=True, intercept=False, return_solver=True)
 
 
-    d = X.shape[1]
-    A = np.zeros((d, d))
-    A[target_idx, target_idx] = 1.0
-    Gamma = np.linalg.solve(sXX, A)
+    # A = e_t e_t' is rank one, so Gamma = inv(sXX) A = g e_t' with g = inv(sXX) e_t
+    t = target_idx
+    e_t = np.zeros(X.shape[1])
+    e_t[t] = 1.0
+    g = solve(e_t)
 
 
-    I = np.eye(d)
-    b_corr = np.linalg.inv(I - fpr * Gamma) @ b0
-    V_corr = (
-        np.linalg.inv(I - fpr * Gamma) @ V0 @ np.linalg.inv(I - fpr * Gamma).T
-        + fpr * (1.0 - fpr) * (Gamma @ (V0 + np.outer(b_corr, b_corr)) @ Gamma.T) / m
+    # Sherman-Morrison: inv(I - fpr g e_t') = I + c g e_t' with c = fpr / (1 - fpr g_t)
+    c = fpr / (1.0 - fpr * g[t])
+    b_corr = b0 + c * g * b0[t]
+    V_corr = _rank_one_sandwich(
+        V0, g, c, t, s=fpr * (1.0 - fpr) * (V0[t, t] + b_corr[t] ** 2) / m
     )
     return b_corr, V_corr
 
@@ -129,7 +139,7 @@ def ols_bc_topic_internal(Y, Q, W, S, B, k):
 
     d = Xhat.shape[1]
 
-    _b, V, sXX = _ols_core(Y, Xhat)
+    _b, V, _, solve = _ols_core(Y, Xhat, return_solver=True)
 
     n = Y.shape[0] if Y.ndim > 1 else Y.size
 
@@ -149,111 +159,29 @@ def ols_bc_topic_internal(Y, Q, W, S, B, k):
     r = S.shape[0]
     A[:r, :r] = Omega
 
-    Gamma = (k / math.sqrt(n)) * np.linalg.solve(sXX, A)
+    Gamma = (k / math.sqrt(n)) * solve(A)
 
     return _b, Gamma, V, d
 
 
-def _one_step_core(Y, Xhat, homoskedastic=False, distribution=None):
-    Yj = jnp.asarray(Y).ravel()
-    Xj = jnp.asarray(Xhat)
-    b_jax, V_jax = _one_step_jax_core(Yj, Xj, homoskedastic, distribution)
-    return np.array(b_jax), np.array(V_jax)
-
-@partial(jit, static_argnames=('homoskedastic','distribution'))
-def _one_step_jax_core(Y, Xhat, homoskedastic=False, distribution=None):
-
-    def objective(theta):
-        return likelihood_unlabeled_jax(Y, Xhat, theta, homoskedastic, distribution)
-
-    theta0 = get_starting_values_unlabeled_jax(Y, Xhat, homoskedastic)
-    solver = LBFGS(fun=objective, tol=1e-12, maxiter=500)
-    sol = solver.run(theta0)
-    th_opt = sol.params
-
-    H = hessian(objective)(th_opt)
-    d = Xhat.shape[1]
-    b = th_opt[:d]
-    V = jnp.linalg.pinv(H)[:d, :d]
-    return b, V
-
-
-def likelihood_unlabeled_jax(Y, Xhat, theta, homoskedastic, distribution=None):
-
-    Y = jnp.ravel(Y)
-    d = Xhat.shape[1]
-    b, w00, w01, w10, sigma0, sigma1 = theta_to_pars_jax(theta, d, homoskedastic)
-
-    w11 = 1.0 / (1.0 + jnp.exp(theta[d]) + jnp.exp(theta[d+1]) + jnp.exp(theta[d+2]))
-    mu = Xhat @ b  # (n,)
-    
-
-    pdf = normal_pdf if distribution is None else distribution
-
-    term1_1 = w11 * pdf(Y, mu, sigma1)
-    term2_1 = w10 * pdf(Y, mu - b[0], sigma0)
-
-    term1_0 = w01 * pdf(Y, mu + b[0], sigma1)
-    term2_0 = w00 * pdf(Y, mu, sigma0)
-    indicator = Xhat[:, 0]
-
-    log_term = jnp.where(indicator == 1.0,
-                         jnp.log(term1_1 + term2_1),
-                         jnp.log(term1_0 + term2_0))
-    return -jnp.sum(log_term)
-
-def theta_to_pars_jax(theta, d, homoskedastic):
+def theta_to_log_pars_jax(theta, d, homoskedastic):
+    # log (w00, w01, w10, w11), with w11 as the reference category
     b = theta[:d]
-    v = theta[d:d+3]
-    exp_v = jnp.exp(v)
-    w = exp_v / (1.0 + jnp.sum(exp_v))
+    log_w = jax.nn.log_softmax(jnp.concatenate([theta[d:d+3], jnp.zeros(1, dtype=theta.dtype)]))
     sigma0 = jnp.exp(theta[d+3])
     sigma1 = sigma0 if homoskedastic else jnp.exp(theta[d+4])
-    return b, w[0], w[1], w[2], sigma0, sigma1
+    return b, log_w, sigma0, sigma1
 
-def get_starting_values_unlabeled_jax(Y, Xhat, homoskedastic):
-    Y = jnp.ravel(Y)
-    Xhat = jnp.asarray(Xhat)
+def _sxx_solver(sXX):
+    """Return rhs -> inv(sXX) rhs: Cholesky when sXX is numerically SPD, LU otherwise."""
+    try:
+        cho = cho_factor(sXX)
+    except np.linalg.LinAlgError:
+        # nearly collinear designs can fail Cholesky where LU still solves
+        return partial(np.linalg.solve, sXX)
+    return partial(cho_solve, cho)
 
-    b = ols_jax(Y, Xhat, se=False)
-    u = Y - Xhat @ b
-    sigma = jnp.std(u)
-
-    def pdf_func(y, loc, scale):
-        return jnp.exp(-0.5 * jnp.square((y - loc) / scale)) / (jnp.sqrt(2 * jnp.pi) * scale)
-    mu = Xhat @ b
-
-    cond1 = pdf_func(Y, mu, sigma) > pdf_func(Y, mu - b[0], sigma)
-    cond2 = pdf_func(Y, mu + b[0], sigma) > pdf_func(Y, mu, sigma)
-    X_imputed = jnp.where(Xhat[:, 0] == 1.0,
-                          cond1.astype(jnp.float32),
-                          cond2.astype(jnp.float32))
-    freq00 = jnp.mean(((Xhat[:, 0] == 0.0) & (X_imputed == 0.0)).astype(jnp.float32))
-    freq01 = jnp.mean(((Xhat[:, 0] == 0.0) & (X_imputed == 1.0)).astype(jnp.float32))
-    freq10 = jnp.mean(((Xhat[:, 0] == 1.0) & (X_imputed == 0.0)).astype(jnp.float32))
-    freq11 = jnp.mean(((Xhat[:, 0] == 1.0) & (X_imputed == 1.0)).astype(jnp.float32))
-    w00 = jnp.maximum(freq00, 0.001)
-    w01 = jnp.maximum(freq01, 0.001)
-    w10 = jnp.maximum(freq10, 0.001)
-    w11 = jnp.maximum(freq11, 0.001)
-    w = jnp.array([w00, w01, w10, w11])
-    w = w / jnp.sum(w)
-    v = jnp.log(w[:3] / w[3])
-
-    mask0 = (X_imputed == 0.0)
-    mask1 = (X_imputed == 1.0)
-    sigma0 = subset_std(u, mask0)
-    sigma1 = subset_std(u, mask1)
-    sigma0 = jnp.where(jnp.isnan(sigma0), sigma1, sigma0)
-    sigma1 = jnp.where(jnp.isnan(sigma1), sigma0, sigma1)
-    if homoskedastic:
-        p_val = jnp.mean(X_imputed)
-        sigma_comb = sigma1 * p_val + sigma0 * (1.0 - p_val)
-        return jnp.concatenate([b, v, jnp.array([jnp.log(sigma_comb)])])
-    else:
-        return jnp.concatenate([b, v, jnp.array([jnp.log(sigma0), jnp.log(sigma1)])])
-
-def _ols_core(Y, X, se=True, intercept=False):  
+def _ols_core(Y, X, se=True, intercept=False, return_solver=False):  
 
     Y = np.asarray(Y).flatten()
     X = np.asarray(X)
@@ -269,7 +197,8 @@ def _ols_core(Y, X, se=True, intercept=False):
     n, d = X.shape
     sXX  = (1.0 / n) * (X.T @ X)
     sXY  = (1.0 / n) * (X.T @ Y)
-    b    = np.linalg.solve(sXX, sXY)
+    solve = _sxx_solver(sXX)
+    b     = solve(sXY)
 
     if not se:
 
@@ -278,53 +207,117 @@ def _ols_core(Y, X, se=True, intercept=False):
         return b
 
 
-    Omega = np.zeros((d, d))
-    for i in range(n):
-        x_i = X[i]
-        u   = Y[i] - x_i @ b
-        Omega += (u**2) * np.outer(x_i, x_i)
+    u = Y - X @ b
+    hc_omega = _hc_omega_kernel() if d <= 16 and n >= 1_000_000 else None
+    if hc_omega is not None:
+        # opt-in fused kernel; skips the (n, d) temporary
+        Omega = hc_omega(X, u)
+    else:
+        # Omega = sum_i u_i^2 x_i x_i' as a single GEMM
+        Xu    = X * u[:, None]
+        Omega = Xu.T @ Xu
 
-    inv_sXX = np.linalg.inv(sXX)
+    inv_sXX = solve(np.eye(d))
     V       = inv_sXX @ Omega @ inv_sXX / (n**2)
 
 
     if intercept:
         b, V = _reorder_intercept_first(b, V, True)
 
-    return b, V, sXX
+    # the sXX solver is appended when return_solver=True
+    return (b, V, sXX, solve) if return_solver else (b, V, sXX)
     
-def ols_jax(Y, X, se=True):
+@lru_cache(maxsize=None)
+def _hc_omega_kernel():
+    """Compile the numba HC kernel on first use; None unless opted in and numba is installed.
+
+    With an optimized BLAS the GEMM path is as fast up to n ~ 1e6 and needs no
+    compilation, so the kernel is only used when VALIDMLINFERENCE_NUMBA_HC=1.
+    """
+    if os.environ.get("VALIDMLINFERENCE_NUMBA_HC") != "1":
+        return None
+    try:
+        import numba
+    except ImportError:  # numba is optional; _ols_core falls back to BLAS
+        return None
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _hc_omega(X, u, nthreads):
+        # sum_i u_i^2 x_i x_i', accumulated per chunk to avoid racing on the output
+        n, d = X.shape
+        nchunks = min(nthreads, n)
+        partial_sums = np.zeros((nchunks, d, d))
+        for c in numba.prange(nchunks):
+            O = partial_sums[c]
+            for i in range(c * n // nchunks, (c + 1) * n // nchunks):
+                u2 = u[i] * u[i]
+                for j in range(d):
+                    xj = u2 * X[i, j]
+                    for k in range(j + 1):
+                        O[j, k] += xj * X[i, k]
+        Omega = partial_sums.sum(axis=0)
+        for j in range(d):
+            for k in range(j):
+                Omega[k, j] = Omega[j, k]
+        return Omega
+
+    # one memory layout, so F-ordered inputs (e.g. DataFrame.values) do not recompile
+    return lambda X, u: _hc_omega(np.ascontiguousarray(X, dtype=np.float64),
+                                  np.ascontiguousarray(u, dtype=np.float64),
+                                  numba.get_num_threads())
+
+def ols_jax(Y, X, se=True, return_fit=False):
 
     Y = jnp.ravel(Y)
     X = jnp.asarray(X)
     n, d = X.shape
     sXX = (1.0 / n) * (X.T @ X)
     sXY = (1.0 / n) * (X.T @ Y)
-    b = jnp.linalg.solve(sXX, sXY)
+    cho = jcho_factor(sXX)
+
+    # jax's Cholesky returns nan instead of raising; fall back to LU in that case
+    def solve(rhs):
+        return jax.lax.cond(jnp.all(jnp.isfinite(cho[0])),
+                            lambda r: jcho_solve(cho, r),
+                            lambda r: jnp.linalg.solve(sXX, r),
+                            rhs)
+
+    b = solve(sXY)
+    if se or return_fit:
+        # fitted values and residuals, appended to the output when return_fit=True
+        mu = X @ b
+        residuals = Y - mu
     if se:
 
-        residuals = Y - X @ b
-        # Compute Omega = sum_i [u_i^2 * (x_i x_i^T)]
-        Omega = jnp.sum(jnp.einsum('ni,nj->nij', X, X) * (residuals**2)[:, None, None], axis=0)
-        inv_sXX = jnp.linalg.inv(sXX)
+        # Compute Omega = sum_i [u_i^2 * (x_i x_i^T)] without the (n, d, d) intermediate
+        Xu = X * residuals[:, None]
+        Omega = Xu.T @ Xu
+        inv_sXX = solve(jnp.eye(d))
         V = inv_sXX @ Omega @ inv_sXX / (n**2)
-        return b, V, sXX
+        return (b, V, sXX, mu, residuals) if return_fit else (b, V, sXX)
     else:
-        return b
+        return (b, mu, residuals) if return_fit else b
 
 
 def log_normal_pdf(x, loc, scale):
-    return -0.5 * jnp.log(2 * jnp.pi) - jnp.log(scale) - 0.5 * jnp.square((x - loc) / scale)
+    return jnorm.logpdf(x, loc, scale)
 
-def normal_pdf(x, loc, scale):
-    return jnp.exp(log_normal_pdf(x, loc, scale))
+def _logpdf_fn(distribution):
+    # Work in log space for the mixture; a user-supplied pdf is logged directly.
+    if distribution is None:
+        return log_normal_pdf
+    return lambda x, loc, scale: jnp.log(distribution(x, loc, scale))
 
 def subset_std(x, mask):
 
-    mask = mask.astype(jnp.float32)
-    mean_val = jnp.sum(x * mask) / jnp.sum(mask)
-    var = jnp.sum(mask * jnp.square(x - mean_val)) / jnp.sum(mask)
-    return jnp.sqrt(var)
+    mask = mask.astype(x.dtype)
+    # One pass over x: var = E[x^2] - E[x]^2 (nan for an empty mask, as before)
+    s0 = jnp.sum(mask)
+    s1 = jnp.sum(x * mask)
+    s2 = jnp.sum(x * x * mask)
+    mean_val = s1 / s0
+    var = s2 / s0 - mean_val * mean_val
+    return jnp.sqrt(jnp.maximum(var, 0.0))
 
 def one_step_unlabeled(Y, Xhat, homoskedastic=False, distribution=None, intercept =True):
     print("one_step_unlabeled is deprecated, instead, call the one_step function.")
@@ -381,23 +374,17 @@ def get_starting_values_unlabeled_gaussian_mixture(Y, Xhat, k, homosked):
         Xhat = Xhat[:, None]
     n, d = Xhat.shape
 
-    b = ols_jax(Y, Xhat, se=False)
-    
-    u = Y - Xhat @ b
+    b, μ, u = ols_jax(Y, Xhat, se=False, return_fit=True)
     sigma = jnp.std(u)
     
-    μ = Xhat @ b
     treatment_effect = b[0]  
     
-    p11 = jnp.exp(-0.5 * jnp.square((Y - μ) / sigma)) / (jnp.sqrt(2 * jnp.pi) * sigma)
-    p10 = jnp.exp(-0.5 * jnp.square((Y - (μ - treatment_effect)) / sigma)) / (jnp.sqrt(2 * jnp.pi) * sigma)
-    p01 = jnp.exp(-0.5 * jnp.square((Y - (μ + treatment_effect)) / sigma)) / (jnp.sqrt(2 * jnp.pi) * sigma)
-    p00 = jnp.exp(-0.5 * jnp.square((Y - μ) / sigma)) / (jnp.sqrt(2 * jnp.pi) * sigma)
-    
+    # Equal-variance normal densities compare through squared deviations only:
+    # p11 > p10  <=>  u^2 < (u + te)^2  <=>  te * (2u + te) > 0, and likewise for p01 > p00.
     is_treated = (Xhat[:, 0] == 1.0)
     X_imputed = jnp.where(is_treated, 
-                         (p11 > p10).astype(jnp.float32),
-                         (p01 > p00).astype(jnp.float32))
+                         (treatment_effect * (2 * u + treatment_effect) > 0).astype(u.dtype),
+                         (treatment_effect * (2 * u - treatment_effect) > 0).astype(u.dtype))
     
     mask00 = (Xhat[:, 0] == 0) & (X_imputed == 0)
     mask01 = (Xhat[:, 0] == 0) & (X_imputed == 1)
@@ -492,42 +479,62 @@ def _one_step_gaussian_mixture_core(Y, Xhat, k=2, homosked=False,
 
     θ0 = get_starting_values_unlabeled_gaussian_mixture(Yj, Xj, k, homosked)
     
-    solver = LBFGS(fun=lambda th: likelihood_unlabeled_gaussian_mixture(th, Yj, Xj, k, homosked),
-                   maxiter=maxiter, tol=1e-12)
-    
     key = jr.PRNGKey(seed)
     subkeys = jr.split(key, nguess)
     
-    best_loss, best_θ = jnp.inf, θ0
-    
-    for i, sk in enumerate(subkeys):
-        if i == 0:
-            θ_try = θ0
-        else:
-            noise_scale = 0.05 + 0.02 * (i / nguess)  
-            noise = jr.normal(sk, θ0.shape) * noise_scale
-            
-            d = Xj.shape[1]
-            noise = noise.at[:d].multiply(0.5)  
-            noise = noise.at[d:d+3].multiply(0.3)  
-            
-            θ_try = θ0 + noise
-        
-        try:
-            out = solver.run(θ_try)
-            if out.state.value < best_loss and jnp.isfinite(out.state.value):
-                best_loss, best_θ = out.state.value, out.params
-        except:
-            continue
-    
-    H = hessian(lambda th: likelihood_unlabeled_gaussian_mixture(th, Yj, Xj, k, homosked))(best_θ)
+    # the first guess is θ0 itself; the rest are jittered copies
+    d = Xj.shape[1]
+    noise_scale = 0.05 + 0.02 * (jnp.arange(nguess) / nguess)
+    noise = jax.vmap(lambda sk: jr.normal(sk, θ0.shape))(subkeys) * noise_scale[:, None]
+    noise = noise.at[:, :d].multiply(0.5)
+    noise = noise.at[:, d:d+3].multiply(0.3)
+    noise = noise.at[0].set(0.0)
+    
+    θ_starts = np.asarray(θ0 + noise)
+
+    from scipy.optimize import minimize as scipy_minimize
+    n = Xj.shape[0]
+
+    # mean NLL, as in the one-step fit, so that gtol is reachable
+    def fun(θ):
+        value, g = _gaussian_mixture_value_and_grad(jnp.asarray(θ), Yj, Xj, k, homosked)
+        return float(value) / n, np.asarray(g) / n
+
+    # each start gets its own L-BFGS-B run and the best finite loss wins; a longer
+    # history than the default 10 pairs helps on the flat mixture likelihood
+    best = None
+    for θ_try in θ_starts:
+        sol = scipy_minimize(fun, θ_try, jac=True, method='L-BFGS-B',
+                             options={'maxiter': maxiter, 'maxcor': 20, 'ftol': 1e-15, 'gtol': 1e-8})
+        if np.isfinite(sol.fun) and (best is None or sol.fun < best.fun):
+            best = sol
+
+    if best is None:
+        warnings.warn("Gaussian-mixture MLE: no start reached a finite likelihood; "
+                      "returning the starting values", RuntimeWarning)
+        best_θ = θ_starts[0]
+    else:
+        if not best.success:
+            warnings.warn(f"Gaussian-mixture MLE did not converge ({best.message}); "
+                          "try a larger maxiter", RuntimeWarning)
+        best_θ = best.x
+
+    H = _gaussian_mixture_hessian(jnp.asarray(best_θ), Yj, Xj, k, homosked)
     cov = jnp.linalg.pinv(H)
-    
-    b_jax = best_θ[:Xj.shape[1]]
-    V_jax = cov[:Xj.shape[1], :Xj.shape[1]]
-    
+
+    b_jax = best_θ[:d]
+    V_jax = cov[:d, :d]
+
     return np.array(b_jax), np.array(V_jax)
 
+@partial(jit, static_argnames=('k', 'homosked'))
+def _gaussian_mixture_value_and_grad(θ, Y, Xhat, k, homosked):
+    return jax.value_and_grad(likelihood_unlabeled_gaussian_mixture)(θ, Y, Xhat, k, homosked)
+
+@partial(jit, static_argnames=('k', 'homosked'))
+def _gaussian_mixture_hessian(θ, Y, Xhat, k, homosked):
+    return jax.jacfwd(grad(likelihood_unlabeled_gaussian_mixture))(θ, Y, Xhat, k, homosked)
+
 def _reorder_intercept_first(b, V, intercept):
     if not intercept:
         return b, V
@@ -631,84 +638,113 @@ def summarize_coefs(b, V, names=None, alpha=0.05):
 @partial(jit, static_argnames=('treatment_idx', 'homoskedastic','distribution'))
 def _one_step_jax_core_with_treatment_idx(Y, Xhat, treatment_idx, homoskedastic=False, distribution=None):
 
+    n, d = Xhat.shape
+
+    # BFGS starts from an identity inverse Hessian, so put the coefficients on a
+    # common scale: divide the non-treatment columns by their RMS, and Y by its
+    # standard deviation when the errors are normal (a location-scale family, so
+    # the fit maps back exactly). b and V are rescaled at the end.
+    c = jnp.sqrt(jnp.mean(Xhat * Xhat, axis=0)).at[treatment_idx].set(1.0)
+    c = jnp.where(c > 0, c, 1.0)
+    s = jnp.std(Y) if distribution is None else jnp.ones((), Y.dtype)
+    Y, Xhat = Y / s, Xhat / c
+
+    # Minimize the mean NLL: on the summed NLL the gradient scales with n, so a
+    # fixed gtol is unreachable and the first BFGS step overshoots.
     def objective(theta):
-        return likelihood_unlabeled_jax_with_treatment_idx(Y, Xhat, theta, treatment_idx, homoskedastic, distribution)
+        return likelihood_unlabeled_jax_with_treatment_idx(Y, Xhat, theta, treatment_idx, homoskedastic, distribution) / n
+
+    # BFGS gives up for good once its line search fails, which on this likelihood
+    # can happen short of the optimum. Rerunning it from that point resets the
+    # inverse-Hessian estimate; one rerun is nearly always enough.
+    def bfgs_pass(carry):
+        theta, _, k = carry
+        sol = minimize(objective, theta, method='BFGS',
+                       options={'maxiter': 500, 'gtol': 1e-8})
+        return sol.x, _bfgs_converged(sol), k + 1
 
     theta0 = get_starting_values_unlabeled_jax_with_treatment_idx(Y, Xhat, treatment_idx, homoskedastic)
-    solver = LBFGS(fun=objective, tol=1e-12, maxiter=500)
-    sol = solver.run(theta0)
-    th_opt = sol.params
+    th_opt, converged, _ = jax.lax.while_loop(lambda c: ~c[1] & (c[2] < 6), bfgs_pass,
+                                              (theta0, jnp.array(False), 0))
 
-    H = hessian(objective)(th_opt)
-    d = Xhat.shape[1]
-    b = th_opt[:d]
-    V = jnp.linalg.pinv(H)[:d, :d]
+    # Hessian of the summed NLL
+    H = n * jax.jacfwd(grad(objective))(th_opt)
+    b = th_opt[:d] * s / c
+    V = jnp.linalg.pinv(H)[:d, :d] * s**2 / jnp.outer(c, c)
     
-    return b, V
+    return b, V, converged
+
+def _bfgs_converged(sol, grad_tol=1e-6):
+    """True where jax.scipy BFGS converged on a mean NLL.
+
+    Once the gradient sits at float64 noise the line search can fail (status 3)
+    just short of gtol; such points are accepted if the gradient is still tiny.
+    """
+    return (sol.status == 0) | (jnp.max(jnp.abs(sol.jac), axis=-1) < grad_tol)
 
 def _one_step_core_with_treatment_idx(Y, Xhat, treatment_idx=0, homoskedastic=False, distribution=None):
 
     Yj = jnp.asarray(Y).ravel()
     Xj = jnp.asarray(Xhat)
-    b_jax, V_jax = _one_step_jax_core_with_treatment_idx(Yj, Xj, treatment_idx, homoskedastic, distribution)
+    b_jax, V_jax, converged = _one_step_jax_core_with_treatment_idx(Yj, Xj, treatment_idx, homoskedastic, distribution)
+    if not converged:
+        warnings.warn("one-step MLE did not converge (BFGS stopped away from a stationary point)",
+                      RuntimeWarning)
 
     return np.array(b_jax), np.array(V_jax)
 
+@partial(jit, static_argnames=('treatment_idx', 'homoskedastic', 'distribution'))
 def likelihood_unlabeled_jax_with_treatment_idx(Y, Xhat, theta, treatment_idx, homoskedastic, distribution=None):
 
     Y = jnp.ravel(Y)
     d = Xhat.shape[1]
-    b, w00, w01, w10, sigma0, sigma1 = theta_to_pars_jax(theta, d, homoskedastic)
-    w11 = 1.0 / (1.0 + jnp.exp(theta[d]) + jnp.exp(theta[d+1]) + jnp.exp(theta[d+2]))
+    b, log_w, sigma0, sigma1 = theta_to_log_pars_jax(theta, d, homoskedastic)
+    log_w00, log_w01, log_w10, log_w11 = log_w
     mu = Xhat @ b
     
-    pdf = normal_pdf if distribution is None else distribution
+    logpdf = _logpdf_fn(distribution)
 
     treatment_effect = b[treatment_idx]
     
-    term1_1 = w11 * pdf(Y, mu, sigma1)
-    term2_1 = w10 * pdf(Y, mu - treatment_effect, sigma0)
-    
-    term1_0 = w01 * pdf(Y, mu + treatment_effect, sigma1)
-    term2_0 = w00 * pdf(Y, mu, sigma0)
-    
-    indicator = Xhat[:, treatment_idx]
-    log_term = jnp.where(indicator == 1.0,
-                         jnp.log(term1_1 + term2_1),
-                         jnp.log(term1_0 + term2_0))
+    indicator = Xhat[:, treatment_idx] == 1.0
+
+    # Each row only needs the two components matching its observed label,
+    # so pick locations and weights per row and evaluate two densities, not four.
+    loc1 = mu + jnp.where(indicator, 0.0, treatment_effect)
+    loc0 = mu - jnp.where(indicator, treatment_effect, 0.0)
+    log_w1 = jnp.where(indicator, log_w11, log_w01)
+    log_w0 = jnp.where(indicator, log_w10, log_w00)
+
+    log_term = jnp.logaddexp(log_w1 + logpdf(Y, loc1, sigma1),
+                             log_w0 + logpdf(Y, loc0, sigma0))
     return -jnp.sum(log_term)
 
+@partial(jit, static_argnames=('treatment_idx', 'homoskedastic'))
 def get_starting_values_unlabeled_jax_with_treatment_idx(Y, Xhat, treatment_idx, homoskedastic):
 
     Y = jnp.ravel(Y)
-    Xhat = jnp.asarray(Xhat)
-    b = ols_jax(Y, Xhat, se=False)
-    u = Y - Xhat @ b
-    sigma = jnp.std(u)
-    
-    def pdf_func(y, loc, scale):
-        return jnp.exp(-0.5 * jnp.square((y - loc) / scale)) / (jnp.sqrt(2 * jnp.pi) * scale)
-    
-    mu = Xhat @ b
+    b, _, u = ols_jax(Y, Xhat, se=False, return_fit=True)
     treatment_effect = b[treatment_idx]
     
-    cond1 = pdf_func(Y, mu, sigma) > pdf_func(Y, mu - treatment_effect, sigma)
-    cond2 = pdf_func(Y, mu + treatment_effect, sigma) > pdf_func(Y, mu, sigma)
+    # With a common sigma the normal densities compare through squared deviations only:
+    # pdf(Y, mu) > pdf(Y, mu - te)  <=>  u^2 < (u + te)^2  <=>  te * (2u + te) > 0
+    cond1 = treatment_effect * (2 * u + treatment_effect) > 0
+    cond2 = treatment_effect * (2 * u - treatment_effect) > 0
     
     X_imputed = jnp.where(Xhat[:, treatment_idx] == 1.0,
-                          cond1.astype(jnp.float32),
-                          cond2.astype(jnp.float32))
+                          cond1.astype(u.dtype),
+                          cond2.astype(u.dtype))
     
-    freq00 = jnp.mean(((Xhat[:, treatment_idx] == 0.0) & (X_imputed == 0.0)).astype(jnp.float32))
-    freq01 = jnp.mean(((Xhat[:, treatment_idx] == 0.0) & (X_imputed == 1.0)).astype(jnp.float32))
-    freq10 = jnp.mean(((Xhat[:, treatment_idx] == 1.0) & (X_imputed == 0.0)).astype(jnp.float32))
-    freq11 = jnp.mean(((Xhat[:, treatment_idx] == 1.0) & (X_imputed == 1.0)).astype(jnp.float32))
+    freq00 = jnp.mean(((Xhat[:, treatment_idx] == 0.0) & (X_imputed == 0.0)).astype(u.dtype))
+    freq01 = jnp.mean(((Xhat[:, treatment_idx] == 0.0) & (X_imputed == 1.0)).astype(u.dtype))
+    freq10 = jnp.mean(((Xhat[:, treatment_idx] == 1.0) & (X_imputed == 0.0)).astype(u.dtype))
+    freq11 = jnp.mean(((Xhat[:, treatment_idx] == 1.0) & (X_imputed == 1.0)).astype(u.dtype))
     
     w00 = jnp.maximum(freq00, 0.001)
     w01 = jnp.maximum(freq01, 0.001)
     w10 = jnp.maximum(freq10, 0.001)
     w11 = jnp.maximum(freq11, 0.001)
-    w = jnp.array([w00, w01, w10, w11])
+    w = jnp.stack([w00, w01, w10, w11])
     w = w / jnp.sum(w)
     v = jnp.log(w[:3] / w[3])
     
@@ -722,6 +758,6 @@ def get_starting_values_unlabeled_jax_with_treatment_idx(Y, Xhat, treatment_idx,
     if homoskedastic:
         p_val = jnp.mean(X_imputed)
         sigma_comb = sigma1 * p_val + sigma0 * (1.0 - p_val)
-        return jnp.concatenate([b, v, jnp.array([jnp.log(sigma_comb)])])
+        return jnp.concatenate([b, v, jnp.log(sigma_comb)[None]])
     else:
-        return jnp.concatenate([b, v, jnp.array([jnp.log(sigma0), jnp.log(sigma1)])])
\ No newline at end of file
+        return jnp.concatenate([b, v, jnp.log(jnp.stack([sigma0, sigma1]))])
\ No newline at end of file